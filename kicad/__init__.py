@@ -30,8 +30,7 @@ def new(class_type, instance):
     In kicad-python this is used to construct wrapper classes
     before injecting the native object.
     """
-    obj = BareClass()
-    obj.__class__ = class_type
+    obj = object.__new__(class_type)
     obj._obj = instance
     return obj
 
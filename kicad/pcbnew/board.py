@@ -1,3 +1,7 @@
+import collections
+import os
+import tempfile
+
 from kicad import pcbnew_bare as pcbnew
 
 import kicad
@@ -8,6 +12,39 @@ from kicad.pcbnew.via import Via
 from kicad.pcbnew.drawing import Drawing
 from kicad.pcbnew.zone import Zone
 from kicad import units, SWIGtype, instanceof
+from kicad.point import Point
+
+# Wrapper constructors for the native item types found in BOARD.GetTracks()
+_TRACK_DISPATCH = {
+    SWIGtype.Via: Via.wrap,
+    SWIGtype.Track: Track.wrap,
+}
+
+# Wrapper constructors for every native type listed by Board.items
+_ITEM_DISPATCH = dict(_TRACK_DISPATCH)
+_ITEM_DISPATCH.update({
+    SWIGtype.Footprint: module.Module.wrap,
+    SWIGtype.Zone: Zone.wrap,
+})
+
+
+def _wrap_item(native):
+    """Wrap a native board item, or return None if it is not supported."""
+    wrapper = _ITEM_DISPATCH.get(type(native))
+    if wrapper is not None:
+        return wrapper(native)
+    if instanceof(native, (SWIGtype.Shape, SWIGtype.Text)):
+        return Drawing.wrap(native)
+    return None
+
+
+# Old and new silkscreen layer names, to recover from the v6 rename
+_SILK_RENAMES = {
+    'F.SilkS': 'F.Silkscreen',
+    'F.Silkscreen': 'F.SilkS',
+    'B.SilkS': 'B.Silkscreen',
+    'B.Silkscreen': 'B.SilkS',
+}
 
 
 class _ModuleList(object):
@@ -43,7 +80,12 @@ class Board(object):
             self._obj = pcbnew.BOARD()
 
         self._modulelist = _ModuleList(self)
-        self._removed_elements = []
+        self._removed_elements = collections.deque()
+        self._layer_id_cache = {}
+        self._layer_name_cache = {}
+        self._design_settings = None
+        self._defaults_cache = {}
+        self._cache_defaults = False
 
     @property
     def native_obj(self):
@@ -86,8 +128,9 @@ class Board(object):
     @property
     def vias(self):
         """An iterator over via objects"""
+        via_type = SWIGtype.Via
         for t in self._obj.GetTracks():
-            if type(t) == SWIGtype.Via:
+            if type(t) is via_type:
                 yield Via.wrap(t)
             else:
                 continue
@@ -95,8 +138,9 @@ class Board(object):
     @property
     def tracks(self):
         """An iterator over track objects"""
+        track_type = SWIGtype.Track
         for t in self._obj.GetTracks():
-            if type(t) == SWIGtype.Track:
+            if type(t) is track_type:
                 yield Track.wrap(t)
             else:
                 continue
@@ -109,8 +153,9 @@ class Board(object):
             This issue was not seen with the other iterators
         """
         builder = list()
+        zone_type = SWIGtype.Zone
         for t in self._obj.Zones():
-            if type(t) == SWIGtype.Zone:
+            if type(t) is zone_type:
                 builder.append(Zone.wrap(t))
             else:
                 continue
@@ -119,9 +164,13 @@ class Board(object):
 
     @property
     def drawings(self):
-        all_drawings = []
-        for drawing in self._obj.GetDrawings():
-            if instanceof(drawing, (SWIGtype.Shape, SWIGtype.Text)):
+        """ An iterator over drawing objects
+            Like zones, the native drawings are put in a list first so that
+            removing drawings during the iteration does not break it.
+        """
+        drawing_types = (SWIGtype.Shape, SWIGtype.Text)
+        for drawing in list(self._obj.GetDrawings()):
+            if instanceof(drawing, drawing_types):
                 yield Drawing.wrap(drawing)
 
     @property
@@ -129,15 +178,31 @@ class Board(object):
         ''' Everything on the board '''
         for item in self.modules:
             yield item
-        for item in self.vias:
-            yield item
-        for item in self.tracks:
-            yield item
+        # Split vias and tracks in one sweep instead of two GetTracks calls
+        for t in self._obj.GetTracks():
+            wrapper = _TRACK_DISPATCH.get(type(t))
+            if wrapper is not None:
+                yield wrapper(t)
         for item in self.zones:
             yield item
         for item in self.drawings:
             yield item
 
+    def _raw_items(self):
+        """Native objects behind Board.items, not yet wrapped.
+
+        Zones and drawings are copied to lists first, as in Board.zones and
+        Board.drawings, so that removing them during the iteration is safe.
+        """
+        for native in self._obj.GetFootprints():
+            yield native
+        for native in self._obj.GetTracks():
+            yield native
+        for native in list(self._obj.Zones()):
+            yield native
+        for native in list(self._obj.GetDrawings()):
+            yield native
+
     @staticmethod
     def from_editor():
         """Provides the board object from the editor."""
@@ -158,7 +223,44 @@ class Board(object):
         self._obj.Save(filename)
 
     def copy(self):
-        return Board(wrap=self._obj.Clone())
+        """Return an independent copy of the board.
+
+        BOARD is non-copyable (its native Clone returns None), so the board
+        is saved to a temporary .kicad_pcb file and loaded back. The file
+        goes to shared memory when available, else to the default temp dir.
+
+        The design settings are copied across, but other settings kept in
+        the project file (.kicad_pro) are not carried to the copy on KiCad 6
+        and later. There, each copy also leaves the empty project LoadBoard
+        opened for the temp file loaded in the settings manager until exit:
+        unloading it would free settings the copied board still refers to.
+        """
+        native = None
+        if os.path.isdir('/dev/shm'):
+            try:
+                native = self._copy_through_file('/dev/shm')
+            except (IOError, OSError):
+                # Read-only or full shared memory: use the default temp dir
+                native = None
+        if native is None:
+            native = self._copy_through_file(None)
+        native.SetFileName(self._obj.GetFileName())
+        try:
+            # LoadBoard opened an empty project next to the temp file
+            native.SetDesignSettings(self._obj.GetDesignSettings())
+        except AttributeError:
+            pass
+        return Board(wrap=native)
+
+    def _copy_through_file(self, tmp_dir):
+        """Save to a temporary file in `tmp_dir` and load it back."""
+        fd, tmp_name = tempfile.mkstemp(suffix='.kicad_pcb', dir=tmp_dir)
+        os.close(fd)
+        try:
+            self._obj.Save(tmp_name)
+            return pcbnew.LoadBoard(tmp_name)
+        finally:
+            os.remove(tmp_name)
 
     # TODO: add setter for Board.filename
     @property
@@ -171,11 +273,49 @@ class Board(object):
         return module.Module(ref, pos, board=self)
 
     @property
-    def default_width(self, width=None):
-        b = self._obj
-        return (
-            float(b.GetDesignSettings().GetCurrentTrackWidth()) /
-            units.DEFAULT_UNIT_IUS)
+    def design_settings(self):
+        """Native design settings of the board, fetched once."""
+        if self._design_settings is None:
+            self._design_settings = self._obj.GetDesignSettings()
+        return self._design_settings
+
+    @property
+    def cache_defaults(self):
+        """Whether the default track width and via sizes are cached.
+
+        Off by default, so the defaults follow the current selection in the
+        design settings. Turn it on for batch work that adds many items with
+        unchanged defaults.
+        """
+        return self._cache_defaults
+
+    @cache_defaults.setter
+    def cache_defaults(self, value):
+        self._cache_defaults = bool(value)
+        self._defaults_cache.clear()
+
+    def invalidate_defaults(self):
+        """Forget the cached default track width and via sizes.
+
+        Only needed with `cache_defaults` on, after changing the current
+        track or via size in the design settings.
+        """
+        self._defaults_cache.clear()
+
+    def _read_default(self, key, read):
+        if not self._cache_defaults:
+            return read()
+        try:
+            return self._defaults_cache[key]
+        except KeyError:
+            value = self._defaults_cache[key] = read()
+            return value
+
+    @property
+    def default_width(self):
+        return self._read_default('width', lambda: (
+            float(self.design_settings.GetCurrentTrackWidth()) /
+            units.DEFAULT_UNIT_IUS))
 
     def add_track_segment(self, start, end, layer='F.Cu', width=None):
         """Create a track segment."""
@@ -185,44 +325,64 @@ class Board(object):
         self._obj.Add(track.native_obj)
         return track
 
+    def invalidate_layers(self):
+        """Forget the cached layer name <-> id lookups.
+
+        Call this when layers are renamed, enabled or disabled while this
+        Board is in use, for example in Board Setup with a long-lived
+        `Board.from_editor()` in the scripting console, or through
+        `native_obj.SetLayerName`.
+        """
+        self._layer_id_cache.clear()
+        self._layer_name_cache.clear()
+
     def get_layer_id(self, name):
+        cached = self._layer_id_cache.get(name)
+        if cached is not None:
+            return cached
         lid = self._obj.GetLayerID(name)
-        if lid == -1:
+        if lid == -1 and name in _SILK_RENAMES:
             # Try to recover from silkscreen rename
-            if name == 'F.SilkS':
-                lid = self._obj.GetLayerID('F.Silkscreen')
-            elif name == 'F.Silkscreen':
-                lid = self._obj.GetLayerID('F.SilkS')
-            elif name == 'B.SilkS':
-                lid = self._obj.GetLayerID('B.Silkscreen')
-            elif name == 'B.Silkscreen':
-                lid = self._obj.GetLayerID('B.Silkscreen')
+            lid = self._obj.GetLayerID(_SILK_RENAMES[name])
         if lid == -1:
             raise ValueError('Layer {} not found in this board'.format(name))
+        self._layer_id_cache[name] = lid
         return lid
 
     def get_layer_name(self, layer_id):
-        return self._obj.GetLayerName(layer_id)
+        name = self._layer_name_cache.get(layer_id)
+        if name is None:
+            name = self._obj.GetLayerName(layer_id)
+            self._layer_name_cache[layer_id] = name
+        return name
 
     def add_track(self, coords, layer='F.Cu', width=None):
         """Create a track polyline.
 
         Create track segments from each coordinate to the next.
         """
-        for n in range(len(coords) - 1):
-            self.add_track_segment(coords[n], coords[n + 1],
-                                   layer=layer, width=width)
+        width = width or self.default_width
+        # Convert each coordinate once; inner points are shared by two segments
+        points = [Point.build_from(coord) for coord in coords]
+        add_native = self._obj.Add
+        for n in range(len(points) - 1):
+            track = Track(width, points[n], points[n + 1], layer, board=self)
+            add_native(track.native_obj)
 
     @property
     def default_via_size(self):
-        return (float(self._obj.GetDesignSettings().GetCurrentViaSize()) /
-                units.DEFAULT_UNIT_IUS)
+        return self._read_default('via_size', lambda: (
+            float(self.design_settings.GetCurrentViaSize()) /
+            units.DEFAULT_UNIT_IUS))
 
     @property
     def default_via_drill(self):
-        via_drill = self._obj.GetDesignSettings().GetCurrentViaDrill()
+        return self._read_default('via_drill', self._read_via_drill)
+
+    def _read_via_drill(self):
+        via_drill = self.design_settings.GetCurrentViaDrill()
         if via_drill > 0:
-            return (float(via_drill) / units.DEFAULT_UNIT_IUS)
+            return float(via_drill) / units.DEFAULT_UNIT_IUS
         else:
             return 0.2
 
@@ -248,8 +408,13 @@ class Board(object):
 
     def add_polyline(self, coords, layer='F.SilkS', width=0.15):
         """Create a graphic polyline on the board"""
-        for n in range(len(coords) - 1):
-            self.add_line(coords[n], coords[n + 1], layer=layer, width=width)
+        # Convert each coordinate once; inner points are shared by two segments
+        points = [Point.build_from(coord) for coord in coords]
+        add_native = self._obj.Add
+        for n in range(len(points) - 1):
+            line = drawing.Segment(points[n], points[n + 1], layer, width,
+                                   board=self)
+            add_native(line.native_obj)
 
     def add_circle(self, center, radius, layer='F.SilkS', width=0.15):
         """Create a graphic circle on the board"""
@@ -277,10 +442,9 @@ class Board(object):
         self._obj.Remove(element._obj)
 
     def restore_removed(self):
-        if hasattr(self, '_removed_elements'):
-            for element in self._removed_elements:
-                self._obj.Add(element._obj)
-        self._removed_elements = []
+        for element in self._removed_elements:
+            self._obj.Add(element._obj)
+        self._removed_elements.clear()
 
     def deselect_all(self):
         self._obj.ClearSelected()
@@ -295,14 +459,27 @@ class Board(object):
 
             >>> xx = next(pcb.selected_items)
         '''
-        for item in self.items:
-            try:
-                if item.is_selected:
+        # Check selection on the native objects and only wrap the ones kept
+        for native in self._raw_items():
+            if native.IsSelected():
+                item = _wrap_item(native)
+                if item is not None:
                     yield item
-            except AttributeError:
-                continue
 
     def fill_zones(self, zone_to_fill=None):
-        ''' zone_to_fill=None fills all zones in this board '''
+        ''' zone_to_fill=None fills all zones in this board.
+            Otherwise pass a Zone or a list of Zones to fill only those.
+            The native ZONE_FILLER already spreads the work over threads.
+        '''
+        if zone_to_fill is None:
+            native_zones = self._obj.Zones()
+        else:
+            if isinstance(zone_to_fill, Zone):
+                zone_to_fill = [zone_to_fill]
+            # Fill takes a non-const vector reference, so a python list
+            # is not converted: build the same native container as Zones()
+            native_zones = type(self._obj.Zones())()
+            for zone in zone_to_fill:
+                native_zones.append(zone.native_obj)
         filler = pcbnew.ZONE_FILLER(self._obj)
-        filler.Fill(self._obj.Zones())
+        filler.Fill(native_zones)
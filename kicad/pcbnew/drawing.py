@@ -64,7 +64,8 @@ class Segment(Drawing):
         self._obj = line
         line.SetStart(Point.native_from(start))
         line.SetEnd(Point.native_from(end))
-        self.layer = layer
+        # Resolve through the caller's board so its layer cache is reused
+        line.SetLayer(pcbnew_layer.get_board_layer_id(board, layer))
         self.width = width
 
     @property
@@ -10,7 +10,8 @@ class Track(HasConnection, HasLayerStrImpl, Selectable, BoardItem):
     def __init__(self, width, start, end, layer='F.Cu', board=None):
         self._obj = SWIGtype.Track(board and board.native_obj)
         self._obj.SetWidth(int(width * units.DEFAULT_UNIT_IUS))
-        self.layer = layer
+        # Resolve through the caller's board so its layer cache is reused
+        self._obj.SetLayer(pcbnew_layer.get_board_layer_id(board, layer))
         self._obj.SetStart(Point.native_from(start))
         self._obj.SetEnd(Point.native_from(end))
 
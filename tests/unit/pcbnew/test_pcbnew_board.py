@@ -1,7 +1,13 @@
+import tempfile
 import unittest
+try:
+    from unittest.mock import patch
+except ImportError:
+    from mock import patch
 
 from kicad import *
 from kicad.pcbnew.board import *
+from kicad.pcbnew.layer import get_std_layer_id
 
 
 class TestPcbnewBoard(unittest.TestCase):
@@ -16,10 +22,21 @@ class TestPcbnewBoard(unittest.TestCase):
         self.assertEqual(1, len(list(self.board.modules)))
         self.board.add_module('M2')
         self.assertEqual(2, len(list(self.board.modules)))
+        self.assertEqual(2, len(self.board.modules))
         refs = [module.reference for module in self.board.modules]
         self.assertIn('M1', refs)
         self.assertIn('M2', refs)
 
+    def test_module_by_ref(self):
+        m1 = self.board.add_module('M1')
+        self.assertEqual('M1', self.board.moduleByRef('M1').reference)
+        self.assertEqual('M1', self.board.modules['M1'].reference)
+        m1.reference = 'M3'
+        self.assertIsNone(self.board.moduleByRef('M1'))
+        self.assertRaises(KeyError, lambda: self.board.modules['M1'])
+        self.board.remove(self.board.moduleByRef('M3'))
+        self.assertIsNone(self.board.moduleByRef('M3'))
+
     def test_track_segment_creation(self):
         self.board.add_track_segment((0, 0), (1, 1))
         self.board.add_track_segment((0, 0), (1, 1), layer='B.Cu')
@@ -30,6 +47,168 @@ class TestPcbnewBoard(unittest.TestCase):
         self.board.add_track([(1, 1), (1, 2)], 'B.Cu')
         self.board.add_track([(1, 2), (2, 2)], 'B.Cu', width=2)
 
+    def test_track_polyline(self):
+        coords = [(0, 0), (1, 1), (1, 2), (2, 2)]
+        self.board.add_track(coords, 'B.Cu', width=0.3)
+        self.board.add_track([(5, 5), (6, 5)])
+        tracks = list(self.board.tracks)
+        self.assertEqual(4, len(tracks))
+        segments = sorted((t.start.mm, t.end.mm) for t in tracks
+                          if t.layer == 'B.Cu')
+        self.assertEqual(sorted(zip(coords, coords[1:])), segments)
+        for track in tracks:
+            if track.layer == 'B.Cu':
+                self.assertAlmostEqual(0.3, track.width)
+            else:
+                self.assertEqual('F.Cu', track.layer)
+                self.assertAlmostEqual(self.board.default_width, track.width)
+
+    def _check_shared_points(self, coords, segments):
+        segments = sorted(segments, key=lambda seg: coords.index(seg.start.mm))
+        self.assertEqual(len(coords) - 1, len(segments))
+        for seg, next_seg in zip(segments, segments[1:]):
+            self.assertEqual(seg.end, next_seg.start)
+        segments[0].end = (5, 5)
+        self.assertEqual(coords[1], segments[1].start.mm)
+        self.assertEqual((5.0, 5.0), segments[0].end.mm)
+
+    def test_track_shared_points(self):
+        coords = [(0, 0), (1, 1), (1, 2), (2, 2)]
+        self.board.add_track(coords)
+        self._check_shared_points(coords, self.board.tracks)
+
+    def test_polyline_shared_points(self):
+        coords = [(0, 0), (1, 1), (1, 2), (2, 2)]
+        self.board.add_polyline(coords)
+        self._check_shared_points(coords, self.board.drawings)
+
+    def test_track_without_board(self):
+        track = Track(0.25, (0, 0), (1, 1), 'B.Cu')
+        self.assertEqual('B.Cu', track.layer)
+        self.assertAlmostEqual(0.25, track.width)
+        self.assertEqual((1.0, 1.0), track.end.mm)
+
+    def test_layer_id_lookup(self):
+        lid = self.board.get_layer_id('B.Cu')
+        self.assertEqual(lid, self.board.get_layer_id('B.Cu'))
+        self.assertEqual('B.Cu', self.board.get_layer_name(lid))
+        self.assertRaises(ValueError, self.board.get_layer_id, 'X.Cu')
+
+    def test_silkscreen_rename(self):
+        self.assertEqual(self.board.get_layer_id('F.SilkS'),
+                         self.board.get_layer_id('F.Silkscreen'))
+        self.assertEqual(self.board.get_layer_id('B.SilkS'),
+                         self.board.get_layer_id('B.Silkscreen'))
+
+    def test_invalidate_layers(self):
+        native = self.board.native_obj
+        front = self.board.get_layer_id('F.Cu')
+        back = self.board.get_layer_id('B.Cu')
+        native.SetLayerName(back, 'Bottom')
+        self.assertEqual(back, self.board.get_layer_id('Bottom'))
+        native.SetLayerName(back, 'Other')
+        native.SetLayerName(front, 'Bottom')
+        self.assertEqual(back, self.board.get_layer_id('Bottom'))
+        self.board.invalidate_layers()
+        self.assertEqual(front, self.board.get_layer_id('Bottom'))
+
+    def test_invalidate_layer_names(self):
+        back = self.board.get_layer_id('B.Cu')
+        self.assertEqual('B.Cu', self.board.get_layer_name(back))
+        self.board.native_obj.SetLayerName(back, 'Bottom')
+        self.assertEqual('B.Cu', self.board.get_layer_name(back))
+        self.board.invalidate_layers()
+        self.assertEqual('Bottom', self.board.get_layer_name(back))
+
+    def test_track_listing_follows_changes(self):
+        self.assertEqual(0, len(list(self.board.tracks)))
+        track = self.board.add_track_segment((0, 0), (1, 1))
+        self.board.add_via((1, 1))
+        self.assertEqual(1, len(list(self.board.tracks)))
+        self.assertEqual(1, len(list(self.board.vias)))
+        self.board.remove(track)
+        self.assertEqual(0, len(list(self.board.tracks)))
+        self.board.restore_removed()
+        self.assertEqual(1, len(list(self.board.tracks)))
+
+    def test_selected_items(self):
+        self.board.add_track_segment((0, 0), (1, 1))
+        track = self.board.add_track_segment((1, 1), (2, 2))
+        self.assertEqual([], list(self.board.selected_items))
+        track.select()
+        selected = list(self.board.selected_items)
+        self.assertEqual(1, len(selected))
+        self.assertEqual(track.end, selected[0].end)
+
+    def _add_zone(self, corners):
+        native = SWIGtype.Zone(self.board.native_obj)
+        native.SetLayer(self.board.get_layer_id('F.Cu'))
+        native.Outline().NewOutline()
+        for corner in corners:
+            native.AppendCorner(Point.native_from(corner), -1)
+        self.board.native_obj.Add(native)
+        return Zone.wrap(native)
+
+    def test_fill_zones(self):
+        zone1 = self._add_zone([(0, 0), (10, 0), (10, 10), (0, 10)])
+        zone2 = self._add_zone([(20, 0), (30, 0), (30, 10), (20, 10)])
+        self.assertEqual(2, len(list(self.board.zones)))
+        self.board.fill_zones(zone1)
+        self.assertTrue(zone1.native_obj.IsFilled())
+        self.assertFalse(zone2.native_obj.IsFilled())
+        self.board.fill_zones([zone2])
+        self.assertTrue(zone2.native_obj.IsFilled())
+
+        for zones_arg in (self.board.zones, None):
+            zone1.native_obj.UnFill()
+            zone2.native_obj.UnFill()
+            self.assertFalse(zone1.native_obj.IsFilled())
+            self.board.fill_zones(zones_arg)
+            self.assertTrue(zone1.native_obj.IsFilled())
+            self.assertTrue(zone2.native_obj.IsFilled())
+
+    def test_remove_selected_items(self):
+        zone = self._add_zone([(0, 0), (10, 0), (10, 10), (0, 10)])
+        self._add_zone([(20, 0), (30, 0), (30, 10), (20, 10)])
+        line = self.board.add_line((0, 0), (1, 1))
+        self.board.add_line((1, 1), (2, 2))
+        zone.select()
+        line.select()
+        for item in self.board.selected_items:
+            self.board.remove(item)
+        self.assertEqual(1, len(list(self.board.zones)))
+        self.assertEqual(1, len(list(self.board.drawings)))
+        self.assertEqual([], list(self.board.selected_items))
+
+    def _check_copy(self, board_copy):
+        self.assertEqual(self.board.filename, board_copy.filename)
+        self.assertEqual(1, len(list(board_copy.tracks)))
+        self.assertEqual(1, len(list(board_copy.vias)))
+        board_copy.add_track_segment((2, 2), (3, 3))
+        self.assertEqual(1, len(list(self.board.tracks)))
+
+    def test_copy(self):
+        self.board.add_track_segment((0, 0), (1, 1))
+        self.board.add_via((1, 1))
+        self._check_copy(self.board.copy())
+
+    def test_copy_without_shared_memory(self):
+        self.board.add_track_segment((0, 0), (1, 1))
+        self.board.add_via((1, 1))
+        mkstemp = tempfile.mkstemp
+        dirs = []
+
+        def failing_shm(suffix, dir):
+            dirs.append(dir)
+            if dir is not None:
+                raise OSError('Read-only file system')
+            return mkstemp(suffix=suffix, dir=dir)
+
+        with patch('tempfile.mkstemp', side_effect=failing_shm):
+            board_copy = self.board.copy()
+        self._check_copy(board_copy)
+        self.assertEqual(None, dirs[-1])
+
     def test_via_creation(self):
         self.board.add_via((1, 1))
         self.board.add_via((1, 2), ('B.Cu', 'F.Cu'), size=2)
@@ -39,6 +218,24 @@ class TestPcbnewBoard(unittest.TestCase):
         self.assertGreater(self.board.default_via_size, 0.1)
         self.assertGreater(self.board.default_via_drill, 0.1)
 
+    def test_default_width_follows_settings(self):
+        settings = self.board.design_settings
+        settings.SetCustomTrackWidth(int(0.77 * DEFAULT_UNIT_IUS))
+        settings.UseCustomTrackViaSize(True)
+        self.assertAlmostEqual(0.77, self.board.default_width)
+        settings.SetCustomTrackWidth(int(0.66 * DEFAULT_UNIT_IUS))
+        self.assertAlmostEqual(0.66, self.board.default_width)
+
+    def test_invalidate_defaults(self):
+        self.board.cache_defaults = True
+        width = self.board.default_width
+        settings = self.board.design_settings
+        settings.SetCustomTrackWidth(int(0.77 * DEFAULT_UNIT_IUS))
+        settings.UseCustomTrackViaSize(True)
+        self.assertEqual(width, self.board.default_width)
+        self.board.invalidate_defaults()
+        self.assertAlmostEqual(0.77, self.board.default_width)
+
     def test_line_creation(self):
         self.board.add_line((0, 0), (1, 1))
         self.board.add_line((0, 0), (1, 1), layer='B.SilkS')
@@ -47,6 +244,25 @@ class TestPcbnewBoard(unittest.TestCase):
     def test_polyline_creation(self):
         self.board.add_polyline([(0, 0), (1, 1), (2, 2)])
 
+    def test_polyline_segments(self):
+        coords = [(0, 0), (1, 1), (1, 2), (2, 2)]
+        self.board.add_polyline(coords, 'B.SilkS', width=0.2)
+        lines = list(self.board.drawings)
+        self.assertEqual(3, len(lines))
+        segments = sorted((line.start.mm, line.end.mm) for line in lines)
+        self.assertEqual(sorted(zip(coords, coords[1:])), segments)
+        silk_id = self.board.get_layer_id('B.SilkS')
+        for line in lines:
+            self.assertEqual(silk_id, self.board.get_layer_id(line.layer))
+            self.assertAlmostEqual(0.2, line.width)
+
+    def test_segment_without_board(self):
+        line = drawing.Segment((0, 0), (1, 1), 'B.SilkS', 0.2)
+        self.assertEqual(get_std_layer_id('B.SilkS'),
+                         get_std_layer_id(line.layer))
+        self.assertAlmostEqual(0.2, line.width)
+        self.assertEqual((1.0, 1.0), line.end.mm)
+
     def test_add_circle(self):
         self.board.add_circle((1, 1), 1)
 